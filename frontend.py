@@ -1,9 +1,10 @@
 import streamlit as st
-import requests
+import httpx
 import json
 
 # CONFIGURATION
 API_URL = "http://127.0.0.1:8000"
+LOGO_URL = "https://cdn-icons-png.flaticon.com/512/201/201623.png"
 st.set_page_config(
     page_title="Wanderlust AI",
     layout="wide",
@@ -11,7 +12,9 @@ st.set_page_config(
 )
 
 # CUSTOM CSS
-st.markdown("""
+# Module-level constant. It is still emitted on every rerun: Streamlit drops
+# any element a rerun doesn't re-render, so skipping it would lose the styles.
+_CSS = """
     <style>
     /* Remove default top padding */
     .block-container {
@@ -37,7 +40,8 @@ st.markdown("""
         background-color: grey;
     }
     /* Custom button styling */
-    div.stButton > button:first-child {
+    div.stButton > button:first-child,
+    div.stFormSubmitButton > button:first-child {
         background-color: #FF4B4B;
         color: white;
         border-radius: 10px;
@@ -46,12 +50,26 @@ st.markdown("""
         font-weight: bold;
         transition: 0.3s;
     }
-    div.stButton > button:first-child:hover {
+    div.stButton > button:first-child:hover,
+    div.stFormSubmitButton > button:first-child:hover {
         background-color: #FF1C1C;
         border: none;
     }
     </style>
-""", unsafe_allow_html=True)
+"""
+st.markdown(_CSS, unsafe_allow_html=True)
+
+@st.cache_data(ttl=600)
+def load_logo():
+    # Downloaded by the server at most once per TTL, then served locally by Streamlit.
+    # A failure is cached too (falling back to the URL for the browser to fetch),
+    # so an unreachable CDN can't stall every rerun.
+    try:
+        response = httpx.get(LOGO_URL, timeout=3.0)
+        response.raise_for_status()
+        return response.content
+    except httpx.HTTPError:
+        return LOGO_URL
 
 st.title("Wanderlust AI")
 st.markdown("#### *Your Intelligent Travel Consultant*")
@@ -59,26 +77,58 @@ st.markdown("---")
 
 # SIDEBAR INPUTS
 with st.sidebar:
-    st.image("https://cdn-icons-png.flaticon.com/512/201/201623.png", width=80)
+    st.image(load_logo(), width=80)
     st.header("Trip Details")
     
-    destination = st.text_input("Destination", "Kyoto, Japan", placeholder="e.g., Paris, London, Goa")
-    duration = st.slider("Duration (Days)", 1, 14, 3)
-    vibe = st.text_area("Vibe / Interests", "Ancient, peaceful, zen gardens, hidden gems", height=100)
-    avoid = st.text_input("Avoid (Optional)", placeholder="e.g., Tourist traps, crowded malls")
-    
-    st.markdown("---")
-    
-    generate_btn = st.button("Plan My Trip", use_container_width=True)
+    # Inputs live in a form so editing them doesn't rerun the app until submitted
+    with st.form("trip_form"):
+        destination = st.text_input("Destination", "Kyoto, Japan", placeholder="e.g., Paris, London, Goa")
+        duration = st.slider("Duration (Days)", 1, 14, 3)
+        vibe = st.text_area("Vibe / Interests", "Ancient, peaceful, zen gardens, hidden gems", height=100)
+        avoid = st.text_input("Avoid (Optional)", placeholder="e.g., Tourist traps, crowded malls")
+        
+        st.markdown("---")
+        
+        generate_btn = st.form_submit_button("Plan My Trip", use_container_width=True)
 
 # APP LOGIC
 
+@st.cache_resource
+def get_client():
+    # One pooled client per server process, so repeat calls reuse the open connection
+    return httpx.Client(base_url=API_URL, timeout=120.0)
+
 # Initialize session state for storing data across reloads
 if "itinerary" not in st.session_state:
     st.session_state["itinerary"] = ""
 if "current_state" not in st.session_state:
     st.session_state["current_state"] = {}
 
+# Progress labels for the /plan/stream status frames
+STEP_LABELS = {
+    "vibe_interpreter": "Picked places that match your vibe",
+    "resolve_city": "Located your destination",
+    "search_places": "Verified places on the map",
+    "itinerary_agent": "Itinerary written"
+}
+
+def stream_itinerary(response, result, status):
+    """
+    Yields itinerary tokens from the /plan/stream SSE feed, shows step progress
+    in the `status` placeholder and stores the final (done or error) frame in `result`.
+    """
+    for line in response.iter_lines():
+        if not line or not line.startswith("data: "):
+            continue
+        event = json.loads(line[len("data: "):])
+        if event["type"] == "status":
+            if event["node"] in STEP_LABELS:
+                status.caption(STEP_LABELS[event["node"]] + "...")
+        elif event["type"] == "token":
+            yield event["content"]
+        elif event["type"] in ("done", "error"):
+            result.update(event)
+
 # 1. HANDLE "START PLAN"
 if generate_btn:
     with st.spinner(f"Agents are researching {destination}... This may take 30-60 seconds."):
@@ -90,14 +140,23 @@ if generate_btn:
         }
         
         try:
-            response = requests.post(f"{API_URL}/plan/start", json=payload)
-            if response.status_code == 200:
-                data = response.json()
-                st.session_state["itinerary"] = data["itinerary_draft"]
-                st.session_state["current_state"] = data["current_state"]
-                st.rerun() # Refresh to show the itinerary
-            else:
-                st.error(f"Error: {response.text}")
+            with get_client().stream("POST", "/plan/stream", json=payload) as response:
+                if response.status_code == 200:
+                    # Render the itinerary token-by-token as the agent writes it
+                    result = {}
+                    status = st.empty()
+                    st.write_stream(stream_itinerary(response, result, status))
+                    if result.get("type") == "error":
+                        st.error(f"Error: {result['detail']}")
+                    elif "current_state" in result:
+                        st.session_state["itinerary"] = result["itinerary_draft"]
+                        st.session_state["current_state"] = result["current_state"]
+                        st.rerun() # Refresh to show the itinerary
+                    else:
+                        st.error("Error: The itinerary stream ended unexpectedly.")
+                else:
+                    response.read()
+                    st.error(f"Error: {response.text}")
         except Exception as e:
             st.error(f"Connection Error: Is the backend running? ({e})")
 
@@ -115,10 +174,12 @@ if st.session_state["itinerary"]:
         st.info(" **Refine your plan**")
         st.markdown("Chat with the agent to tweak the itinerary.")
         
-        feedback_text = st.text_area("Your Feedback", placeholder="e.g., I don't like museums, give me more food spots!")
-        avoid_new = st.text_input("Block a specific place?", placeholder="Name of place to remove")
+        with st.form("feedback_form"):
+            feedback_text = st.text_area("Your Feedback", placeholder="e.g., I don't like museums, give me more food spots!")
+            avoid_new = st.text_input("Block a specific place?", placeholder="Name of place to remove")
+            update_btn = st.form_submit_button("Update Itinerary")
         
-        if st.button("Update Itinerary"):
+        if update_btn:
             with st.spinner("Re-planning based on your feedback..."):
                 resume_payload = {
                     "current_state": st.session_state["current_state"],
@@ -127,7 +188,11 @@ if st.session_state["itinerary"]:
                 }
                 
                 try:
-                    response = requests.post(f"{API_URL}/plan/resume", json=resume_payload)
+                    # /plan/resume sends nothing until the whole plan is ready, which can take
+                    # minutes for long trips, so only the connect/write phases are bounded
+                    response = get_client().post(
+                        "/plan/resume", json=resume_payload, timeout=httpx.Timeout(120.0, read=None)
+                    )
                     if response.status_code == 200:
                         data = response.json()
                         st.session_state["itinerary"] = data["itinerary_draft"]
@@ -1,34 +1,69 @@
 import os
 import json
 import time
+import queue
+import atexit
+import logging
+import logging.handlers
+import asyncio
+import hashlib
+import functools
+import aiohttp
+import numpy as np
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from diskcache import Cache
 from dotenv import load_dotenv
 import openrouteservice
-from geopy.geocoders import Nominatim
-from geopy.distance import geodesic
-from typing import TypedDict, List, Dict, Any, Optional
-from langchain_google_genai import ChatGoogleGenerativeAI
+from typing import TypedDict, List, Dict, Any, Optional, Tuple
 from langchain_groq import ChatGroq
 from langchain_core.tools import tool
-from langgraph.graph import StateGraph, END
+from langchain_core.prompts import PromptTemplate
+from langgraph.graph import StateGraph, START, END
 from pydantic import BaseModel, Field
 from fastapi import FastAPI
+from fastapi.responses import StreamingResponse
 
 # LOAD ENV & INITIALIZE MODELS 
 load_dotenv()
 
+# LOGGING
+# Request code only enqueues records; a background listener thread does the I/O.
+# Set LOG_LEVEL=INFO or DEBUG to see agent progress and tool details. It only
+# applies to this app's logger; libraries (aiohttp, groq, ...) stay at WARNING.
+log_queue = queue.SimpleQueue()
+logging.basicConfig(
+    level=logging.WARNING,
+    format="%(asctime)s %(levelname)s %(name)s: %(message)s",
+    handlers=[logging.handlers.QueueHandler(log_queue)]
+)
+log_listener = logging.handlers.QueueListener(log_queue, logging.StreamHandler())
+log_listener.start()
+atexit.register(log_listener.stop)
+
+logger = logging.getLogger(__name__)
+
+log_level_name = (os.environ.get("LOG_LEVEL") or "WARNING").strip().upper()
+log_level = logging.getLevelName(log_level_name)
+if isinstance(log_level, int):
+    logger.setLevel(log_level)
+else:
+    logger.setLevel(logging.WARNING)
+    logger.warning("Unknown LOG_LEVEL '%s', falling back to WARNING.", log_level_name)
+
 # Model 1: Fast (Llama 3.1 8B)
 llm_fast = ChatGroq(model="llama-3.1-8b-instant", temperature=0)
 
-# Model 2: Tool User (Gemini 2.5 Flash)
-llm_gemini = ChatGoogleGenerativeAI(model="gemini-2.5-flash", temperature=0)
-
-# Model 3: Hero (Llama 3.3 70B)
+# Model 2: Hero (Llama 3.3 70B)
 llm_hero = ChatGroq(model="llama-3.3-70b-versatile", temperature=0)
 
 # Define Structure for Vibe Agent output
 class KeywordList(BaseModel):
     keywords: List[str] = Field(description="A list of specific, real place names.")
 
+# Built once at import rather than on every request
+llm_hero_structured = llm_hero.with_structured_output(KeywordList)
+
 # DEFINE CLIENTS & TOOLS
 
 # Initialize OpenRouteService (Only for Directions now)
@@ -41,101 +76,228 @@ try:
 except Exception:
     ors_client = None
 
-# Initialize Nominatim (Free Geocoder for Search)
-geolocator = Nominatim(user_agent="hybrid_travel_agent_project_final")
+# Nominatim (Free Geocoder for Search), queried directly over aiohttp
+NOMINATIM_URL = "https://nominatim.openstreetmap.org/search"
+NOMINATIM_HEADERS = {"User-Agent": "hybrid_travel_agent_project_final"}
+NOMINATIM_TIMEOUT = aiohttp.ClientTimeout(total=10)
+
+# One keep-alive session shared by every lookup, so only the first request
+# pays for the TCP + TLS handshake. Created lazily on the running event loop.
+nominatim_session: Optional[aiohttp.ClientSession] = None
+
+def get_nominatim_session() -> aiohttp.ClientSession:
+    global nominatim_session
+    if nominatim_session is None or nominatim_session.closed:
+        nominatim_session = aiohttp.ClientSession(headers=NOMINATIM_HEADERS, timeout=NOMINATIM_TIMEOUT)
+    return nominatim_session
+
+# Nominatim allows ~1 req/s for the whole process, so every request reserves a
+# send slot on a shared clock. The first call goes out immediately; later ones
+# only wait for whatever is left of the interval, and the HTTP round trips overlap.
+NOMINATIM_INTERVAL = 1.1
+nominatim_lock = asyncio.Lock()
+nominatim_last_call = [0.0]
+
+async def wait_for_nominatim_slot():
+    async with nominatim_lock:
+        delay = nominatim_last_call[0] + NOMINATIM_INTERVAL - time.monotonic()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        nominatim_last_call[0] = time.monotonic()
+
+async def nominatim_search(session: aiohttp.ClientSession, query: str, limit: int = 1):
+    """Raw Nominatim /search call. Returns the list of JSON matches."""
+    # jsonv2 is the slimmest format; address details are kept for the locality hint
+    params = {"q": query, "format": "jsonv2", "addressdetails": 1, "limit": limit}
+    await wait_for_nominatim_slot()
+    async with session.get(NOMINATIM_URL, params=params) as response:
+        response.raise_for_status()
+        return await response.json()
+
+# GEOCODE CACHE
+# Geocoding is deterministic for a given query, so results are kept in a small
+# in-process LRU backed by an on-disk cache that survives restarts.
+# Each record is a (lat, lon, address, importance, area) tuple.
+GEOCODE_CACHE_SIZE = 4096
+GEOCODE_TTL = 30 * 24 * 60 * 60  # 30 days
+geocode_memory_cache: "OrderedDict[str, tuple]" = OrderedDict()
+geocode_disk_cache = Cache("./.geocache")
+
+# Structured address fields that name a locality rather than a street,
+# most specific first
+AREA_FIELDS = ("neighbourhood", "quarter", "suburb", "city_district")
+
+def _area_from_address(address: dict) -> Optional[str]:
+    return next((address[f] for f in AREA_FIELDS if address.get(f)), None)
+
+def _geocode_key(query: str, limit: int) -> str:
+    # "v2" covers the area field added to records; older disk entries are ignored
+    return hashlib.blake2b(f"v2|{limit}|{query.strip().lower()}".encode()).hexdigest()
+
+def _remember_geocode(key: str, records: tuple):
+    geocode_memory_cache[key] = records
+    geocode_memory_cache.move_to_end(key)
+    if len(geocode_memory_cache) > GEOCODE_CACHE_SIZE:
+        geocode_memory_cache.popitem(last=False)
+
+async def geocode(session: aiohttp.ClientSession, query: str, limit: int = 1):
+    """Cached Nominatim lookup. Only cache misses hit the network."""
+    key = _geocode_key(query, limit)
+    if key in geocode_memory_cache:
+        geocode_memory_cache.move_to_end(key)
+        return geocode_memory_cache[key]
+
+    records = geocode_disk_cache.get(key)
+    if records is None:
+        matches = await nominatim_search(session, query, limit)
+        records = tuple(
+            (float(m["lat"]), float(m["lon"]), m["display_name"], float(m.get("importance") or 0.5),
+             _area_from_address(m.get("address") or {}))
+            for m in matches
+        )
+        geocode_disk_cache.set(key, records, expire=GEOCODE_TTL)
 
-@tool
-def query_places_nominatim(query: str, location_name: str):
+    _remember_geocode(key, records)
+    return records
+
+async def geocode_city(session: aiohttp.ClientSession, location_name: str):
     """
-    Smart search that adapts its radius based on the city's 'Importance'.
+    Resolves the target city once and derives the search radius from its 'Importance'.
+    Returns (city_coords, radius_limit), or None if the city can't be found.
     """
-    print(f"--- TOOL: Searching for '{query}' around '{location_name}' ---")
-    
     try:
-        # Get City Details & "Importance"
         # The 'importance' field (0.0 to 1.0) tells us if it's a Megacity or Town
-        city_loc = geolocator.geocode(location_name, timeout=10, addressdetails=True)
-        if not city_loc:
-            print(f"   > Error: Target city '{location_name}' not found.")
-            return []
-        
-        city_coords = (city_loc.latitude, city_loc.longitude)
-        importance = city_loc.raw.get("importance", 0.5)
-        
-        # DYNAMIC RADIUS LOGIC
-        # If importance > 0.75 (London, Tokyo, NYC), use small radius (City limits)
-        # If importance <= 0.75 (Visakhapatnam, Bath), use large radius (Day trips allowed)
-        if importance > 0.75:
-            radius_limit = 30  # Strict city limit
-            print(f"   > Detected MEGACITY (Score: {importance}). Radius set to {radius_limit}km.")
-        else:
-            radius_limit = 200 # Allow day trips
-            print(f"   > Detected REGIONAL HUB (Score: {importance}). Radius set to {radius_limit}km.")
+        results = await geocode(session, location_name)
+    except Exception as e:
+        logger.warning("   > Tool Error: %s", e)
+        return None
+
+    if not results:
+        logger.warning("   > Error: Target city '%s' not found.", location_name)
+        return None
+
+    city_lat, city_lon, _, importance, _ = results[0]
+    city_coords = (city_lat, city_lon)
+
+    # DYNAMIC RADIUS LOGIC
+    # If importance > 0.75 (London, Tokyo, NYC), use small radius (City limits)
+    # If importance <= 0.75 (Visakhapatnam, Bath), use large radius (Day trips allowed)
+    if importance > 0.75:
+        radius_limit = 30  # Strict city limit
+        logger.debug("   > Detected MEGACITY (Score: %s). Radius set to %skm.", importance, radius_limit)
+    else:
+        radius_limit = 200 # Allow day trips
+        logger.debug("   > Detected REGIONAL HUB (Score: %s). Radius set to %skm.", importance, radius_limit)
+
+    return city_coords, radius_limit
+
+EARTH_RADIUS_KM = 6371.0
+
+def haversine_km(origin: tuple, lats: List[float], lons: List[float]) -> np.ndarray:
+    """Great-circle distances (km) from origin (lat, lon) to every point, in one vectorized pass."""
+    lats, lons = np.radians(lats), np.radians(lons)
+    o_lat, o_lon = np.radians(origin[0]), np.radians(origin[1])
+    a = np.sin((lats - o_lat) / 2) ** 2 + np.cos(o_lat) * np.cos(lats) * np.sin((lons - o_lon) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(a))
+
+async def query_places_nominatim_async(session: aiohttp.ClientSession, query: str, location_name: str,
+                                       city_coords: tuple, radius_limit: int):
+    """
+    Verifies a single keyword around an already-resolved city.
+    """
+    logger.debug("--- TOOL: Searching for '%s' around '%s' ---", query, location_name)
 
+    try:
         # Strategy A: Strict Search ("Place, City")
         full_query = f"{query}, {location_name}"
-        time.sleep(1.1) 
-        place_loc = geolocator.geocode(full_query, timeout=10)
-        
+        matches = await geocode(session, full_query)
+        place_loc = matches[0] if matches else None
+
         # Strategy B: Global Search + Smart Distance Filter
         if not place_loc:
-            print(f"   > Strict search failed. Trying global search for '{query}'...")
-            time.sleep(1.1)
+            logger.debug("   > Strict search failed. Trying global search for '%s'...", query)
             # Fetch top 5 global matches
-            candidates = geolocator.geocode(query, exactly_one=False, limit=5, timeout=10)
-            
+            candidates = await geocode(session, query, limit=5)
+
             if candidates:
-                for cand in candidates:
-                    cand_coords = (cand.latitude, cand.longitude)
-                    dist = geodesic(city_coords, cand_coords).km
-                    
-                    # Check against our DYNAMIC radius
-                    if dist <= radius_limit: 
-                        place_loc = cand
-                        print(f"   > Found match via global search: {cand.address} ({int(dist)}km away)")
-                        break
-                    else:
-                        print(f"   > Skipping candidate: {int(dist)}km away (Limit: {radius_limit}km)")
-        
+                dists_km = haversine_km(city_coords, [c[0] for c in candidates], [c[1] for c in candidates])
+                idx = int(np.argmin(dists_km))
+                dist = dists_km[idx]
+
+                # Check the closest candidate against our DYNAMIC radius
+                if dist <= radius_limit:
+                    place_loc = candidates[idx]
+                    logger.debug("   > Found match via global search: %s (%dkm away)", place_loc[2], dist)
+                else:
+                    logger.debug("   > Skipping candidates: closest is %dkm away (Limit: %skm)", dist, radius_limit)
+
         if not place_loc:
-            print(f"   > No results found for '{query}'")
+            logger.debug("   > No results found for '%s'", query)
             return []
 
+        place_lat, place_lon, place_address, _, place_area = place_loc
         return [{
             "name": query,
-            "address": place_loc.address,
-            "coordinates": [place_loc.longitude, place_loc.latitude]
+            "address": place_address,
+            "area": place_area,
+            "coordinates": [place_lon, place_lat]
         }]
 
     except Exception as e:
-        print(f"   > Tool Error: {e}")
+        logger.warning("   > Tool Error: %s", e)
         return []
 
 @tool
-def get_ors_directions(start_coords: List[float], end_coords: List[float], profile: str = "foot-walking"):
-    """Gets directions between two locations [lon, lat] using ORS."""
-    if not ors_client: 
-        return {"duration_minutes": 0, "distance_km": 0, "note": "Directions unavailable (No API Key)"}
-    
-    try:
+async def query_places_nominatim(query: str, location_name: str, city_coords: List[float], radius_limit: int):
+    """
+    Smart search around an already-resolved city.
+    city_coords is the city's [lat, lon]; radius_limit (km) comes from the city's 'Importance'.
+    """
+    return await query_places_nominatim_async(get_nominatim_session(), query, location_name,
+                                              tuple(city_coords), radius_limit)
+
+# DIRECTIONS CACHE
+# Routes are keyed on coordinates rounded to 4 decimals (~11m), so tiny float
+# drift between plans still hits the cache. In-process LRU + 7-day disk cache.
+DIRECTIONS_TTL = 7 * 24 * 60 * 60  # 7 days
+directions_disk_cache = Cache("./.orscache")
+
+@functools.lru_cache(maxsize=8192)
+def _ors_directions_cached(s_lon: float, s_lat: float, e_lon: float, e_lat: float, profile: str):
+    # Errors propagate so that failed lookups are never cached
+    key = (s_lon, s_lat, e_lon, e_lat, profile)
+    result = directions_disk_cache.get(key)
+    if result is None:
         directions_result = ors_client.directions(
-            coordinates=[start_coords, end_coords],
+            coordinates=[[s_lon, s_lat], [e_lon, e_lat]],
             profile=profile
         )
         if directions_result['routes']:
             summary = directions_result['routes'][0]['summary']
-            return {
+            result = {
                 "duration_minutes": round(summary.get('duration', 0) / 60, 1),
                 "distance_km": round(summary.get('distance', 0) / 1000, 1)
             }
-        return "No directions found."
+        else:
+            result = "No directions found."
+        directions_disk_cache.set(key, result, expire=DIRECTIONS_TTL)
+    return result
+
+@tool
+def get_ors_directions(start_coords: List[float], end_coords: List[float], profile: str = "foot-walking"):
+    """Gets directions between two locations [lon, lat] using ORS."""
+    if not ors_client: 
+        return {"duration_minutes": 0, "distance_km": 0, "note": "Directions unavailable (No API Key)"}
+    
+    try:
+        return _ors_directions_cached(
+            round(start_coords[0], 4), round(start_coords[1], 4),
+            round(end_coords[0], 4), round(end_coords[1], 4),
+            profile
+        )
     except Exception as e:
         return f"Error using OpenRouteService API: {e}"
 
-# BIND TOOLS
-llm_gemini_tools = llm_gemini.bind_tools([query_places_nominatim])
-llm_hero_tools = llm_hero.bind_tools([get_ors_directions])
-
 # AGENT STATE
 class TravelGraphState(TypedDict):
     destination: str
@@ -146,73 +308,127 @@ class TravelGraphState(TypedDict):
     keywords: List[str]
     search_results: List[dict]
     itinerary_draft: str
+    city_coords: Optional[Tuple[float, float]]
+    radius_limit: Optional[int]
 
 # AGENT NODES
 
-def vibe_interpreter_agent(state: TravelGraphState):
-    print(f"--- 1. VIBE AGENT (Analysing {state['destination']}) ---")
-    
-    llm_hero_structured = llm_hero.with_structured_output(KeywordList)
-    
-    # We aim for ~4 places per day to fill Morning/Afternoon/Evening
-    target_count = max(10, state['duration_days'] * 4)
-    
-    prompt = f"""
+vibe_prompt = PromptTemplate.from_template("""
     You are an expert travel consultant.
-    Destination: {state['destination']}
-    Trip Duration: {state['duration_days']} days.
-    Vibe: {state['vibe']}
-    Avoid: {state['places_to_avoid']}
+    Destination: {destination}
+    Trip Duration: {duration_days} days.
+    Vibe: {vibe}
+    Avoid: {places_to_avoid}
     
     Task: Generate exactly {target_count} search terms.
-    (We need enough places to fill a {state['duration_days']}-day itinerary).
+    (We need enough places to fill a {duration_days}-day itinerary).
     
     STRATEGY:
     1. **Megacities:** Return SPECIFIC NAMES (e.g., "The Louvre").
     2. **Smaller Regions/Cities:** Return GENERIC CATEGORIES (e.g., "Beach", "Seafood Restaurant").
        - Vary the categories! Don't just say "Beach" 5 times. 
        - Use: "Quiet Beach", "Busy Beach", "Sunset Viewpoint", "Local Market", "History Museum", "Portuguese Church", "Spicy Restaurant".
-    """
-    
-    response = llm_hero_structured.invoke(prompt)
-    return {"keywords": response.keywords}
+    """)
 
-def search_agent(state: TravelGraphState):
-    print("--- 2. SEARCH AGENT ---")
+async def vibe_interpreter_agent(state: TravelGraphState):
+    logger.info("--- 1. VIBE AGENT (Analysing %s) ---", state['destination'])
+    
+    # We aim for ~4 places per day to fill Morning/Afternoon/Evening
+    target_count = max(10, state['duration_days'] * 4)
+    
+    prompt = vibe_prompt.format(
+        destination=state['destination'],
+        duration_days=state['duration_days'],
+        vibe=state['vibe'],
+        places_to_avoid=state['places_to_avoid'],
+        target_count=target_count
+    )
     
-    location_fixed = state['destination']
+    response = await llm_hero_structured.ainvoke(prompt)
+    
+    # Each keyword costs a Nominatim request, so drop near-duplicates
+    # ("Seafood Restaurant" / "seafood restaurants") and avoided places up front
+    avoid = {x.strip().lower() for x in state['places_to_avoid']}
+    # The first spelling the LLM gave wins
+    unique = {}
+    for kw in response.keywords:
+        unique.setdefault(kw.strip().lower().rstrip('s'), kw.strip())
+    keywords = [kw for kw in unique.values() if kw.lower() not in avoid]
+    return {"keywords": keywords}
+
+def normalize_destination(destination: str) -> str:
     # Minimal normalization if needed
-    if "London" in location_fixed and "UK" not in location_fixed:
-        location_fixed = "London, UK"
+    if "London" in destination and "UK" not in destination:
+        return "London, UK"
+    return destination
+
+async def resolve_city(state: TravelGraphState):
+    # Only depends on the destination, so it runs alongside the vibe agent
+    logger.info("--- 2a. RESOLVE CITY ---")
     
-    search_prompt = f"""
-    Find coordinates for these: {state['keywords']}. 
-    Use the tool `Maps_nominatim`.
-    CRITICAL: You MUST pass '{location_fixed}' as the 'location_name' argument for every call.
-    """
+    # Already resolved for this trip (e.g. on /plan/resume), no need to geocode again
+    if state.get('city_coords') and state.get('radius_limit'):
+        return {}
     
-    response = llm_gemini_tools.invoke(search_prompt)
+    city = await geocode_city(get_nominatim_session(), normalize_destination(state['destination']))
+    if not city:
+        return {"city_coords": None, "radius_limit": None}
+    
+    city_coords, radius_limit = city
+    return {"city_coords": city_coords, "radius_limit": radius_limit}
+
+async def search_places(state: TravelGraphState):
+    logger.info("--- 2b. SEARCH PLACES ---")
     
+    location_fixed = normalize_destination(state['destination'])
+    
+    # The keywords are already a Python list, so the tool is called directly
+    # for each of them instead of asking an LLM to plan the tool calls.
     all_places = []
-    if response.tool_calls:
-        for tool_call in response.tool_calls:
-            if tool_call['name'] == 'query_places_nominatim':
-                tool_output = query_places_nominatim.invoke(tool_call['args'])
-                if isinstance(tool_output, list):
-                    all_places.extend(tool_output)
-
-    # Deduplicate results
+    if state['keywords'] and state.get('city_coords'):
+        session = get_nominatim_session()
+        results = await asyncio.gather(*(
+            query_places_nominatim_async(session, keyword, location_fixed,
+                                         state['city_coords'], state['radius_limit'])
+            for keyword in state['keywords']
+        ))
+        for tool_output in results:
+            all_places.extend(tool_output)
+
+    # Deduplicate results (case-insensitive, avoided places normalized once)
+    avoid_set = {x.strip().lower() for x in state['places_to_avoid']}
     seen = set()
     final_places = []
     for p in all_places:
-        if p['name'] not in seen and p['name'] not in state['places_to_avoid']:
-            final_places.append(p)
-            seen.add(p['name'])
+        name_key = p['name'].strip().lower()
+        if name_key in seen or name_key in avoid_set:
+            continue
+        seen.add(name_key)
+        final_places.append(p)
             
     return {"search_results": final_places}
 
-def itinerary_agent(state: TravelGraphState):
-    print("--- 3. EXECUTING: Itinerary Agent (Llama 3 70B) ---")
+def compact_place(place: dict) -> dict:
+    """
+    Trims a search result down to what the itinerary prompt needs:
+    the keyword, the venue Nominatim matched and its neighbourhood.
+    Coordinates and full addresses are left out (guideline #4 hides them anyway).
+    """
+    # First address part that isn't a house number
+    parts = (p.strip() for p in place['address'].split(","))
+    venue = next((p for p in parts if p and not p.isdigit()), None)
+    
+    compact = {"name": place['name']}
+    if venue and venue != place['name']:
+        compact["venue"] = venue
+    if place.get('area'):
+        compact["area"] = place['area']
+    return compact
+
+async def itinerary_agent(state: TravelGraphState):
+    logger.info("--- 3. EXECUTING: Itinerary Agent (Llama 3 70B) ---")
+    
+    places_for_prompt = [compact_place(p) for p in state['search_results']]
     
     prompt = f"""
     You are a professional travel itinerary curator for {state['destination']}.
@@ -220,7 +436,7 @@ def itinerary_agent(state: TravelGraphState):
     Context:
     - Trip Duration: {state['duration_days']} days.
     - Desired Vibe: {state['vibe']}.
-    - Verified Locations Found: {json.dumps(state['search_results'], indent=2)}
+    - Verified Locations Found: {json.dumps(places_for_prompt)}
     
     Your Task:
     Construct a logical, narrative-driven itinerary.
@@ -236,38 +452,56 @@ def itinerary_agent(state: TravelGraphState):
     5. **Narrative:** Explain *why* each spot fits the '{state['vibe']}' vibe.
     """
     
-    response = llm_hero.invoke(prompt)
-    return {"itinerary_draft": response.content}
+    # Stream the draft so callers listening on the graph's "messages" stream
+    # (see /plan/stream) receive tokens as soon as they are generated.
+    draft = ""
+    async for chunk in llm_hero.astream(prompt):
+        draft += chunk.content
+    return {"itinerary_draft": draft}
 
 # GRAPH DEFINITION
 
-def await_feedback(state: TravelGraphState):
+async def await_feedback(state: TravelGraphState):
     return {"user_feedback": None}
 
 def check_feedback(state: TravelGraphState):
     if state.get("user_feedback"):
-        return "vibe_interpreter"
+        return ["vibe_interpreter", "resolve_city"]
     else:
         return END
 
 workflow = StateGraph(TravelGraphState)
 workflow.add_node("vibe_interpreter", vibe_interpreter_agent)
-workflow.add_node("search_agent", search_agent)
+workflow.add_node("resolve_city", resolve_city)
+workflow.add_node("search_places", search_places)
 workflow.add_node("itinerary_agent", itinerary_agent)
 workflow.add_node("await_feedback", await_feedback)
 
-workflow.set_entry_point("vibe_interpreter")
-workflow.add_edge("vibe_interpreter", "search_agent")
-workflow.add_edge("search_agent", "itinerary_agent")
+# Fan out: the vibe agent and the city geocode run concurrently,
+# and the keyword search waits for both.
+workflow.add_edge(START, "vibe_interpreter")
+workflow.add_edge(START, "resolve_city")
+workflow.add_edge(["vibe_interpreter", "resolve_city"], "search_places")
+workflow.add_edge("search_places", "itinerary_agent")
 workflow.add_edge("itinerary_agent", "await_feedback")
 workflow.add_conditional_edges(
-    "await_feedback", check_feedback, {"vibe_interpreter": "vibe_interpreter", END: END}
+    "await_feedback", check_feedback, ["vibe_interpreter", "resolve_city", END]
 )
 
-app = workflow.compile()
+@functools.cache
+def get_app():
+    # Compiled once per process and shared by every request. Stateless: no
+    # checkpointer, since the client carries the state between calls.
+    return workflow.compile(checkpointer=None, debug=False)
 
 # FASTAPI SERVER
-api = FastAPI(title="Hybrid-Model Travel Planner")
+@asynccontextmanager
+async def lifespan(api: FastAPI):
+    yield
+    if nominatim_session and not nominatim_session.closed:
+        await nominatim_session.close()
+
+api = FastAPI(title="Hybrid-Model Travel Planner", lifespan=lifespan)
 
 class PlanRequest(BaseModel):
     destination: str
@@ -280,30 +514,122 @@ class ResumeRequest(BaseModel):
     user_feedback: str
     place_to_avoid: Optional[str] = None
 
+def build_initial_state(request: PlanRequest) -> TravelGraphState:
+    # Built field by field (no model_dump) so every state key is populated up front
+    return {
+        "destination": request.destination,
+        "duration_days": request.duration_days,
+        "vibe": request.vibe,
+        "places_to_avoid": list(request.places_to_avoid),
+        "user_feedback": "Start",
+        "keywords": [],
+        "search_results": [],
+        "itinerary_draft": "",
+        "city_coords": None,
+        "radius_limit": None
+    }
+
 @api.post("/plan/start")
-def start_plan(request: PlanRequest):
-    initial_input = request.model_dump()
-    initial_input["user_feedback"] = "Start"
+async def start_plan(request: PlanRequest):
+    initial_input = build_initial_state(request)
     
-    final_state = initial_input.copy()
-    for event in app.stream(initial_input):
-        for node_name, node_output in event.items():
-            if isinstance(node_output, dict):
-                final_state.update(node_output)
+    final_state = await get_app().ainvoke(initial_input)
     
     return {"itinerary_draft": final_state.get('itinerary_draft'), "current_state": final_state}
 
 @api.post("/plan/resume")
-def resume_plan(request: ResumeRequest):
-    resume_state = request.current_state
-    resume_state["user_feedback"] = request.user_feedback
+async def resume_plan(request: ResumeRequest):
+    current = request.current_state
+    resume_state: TravelGraphState = {
+        "destination": current["destination"],
+        "duration_days": current["duration_days"],
+        "vibe": current["vibe"],
+        "places_to_avoid": list(current.get("places_to_avoid", [])),
+        "user_feedback": request.user_feedback,
+        "keywords": current.get("keywords", []),
+        "search_results": current.get("search_results", []),
+        "itinerary_draft": current.get("itinerary_draft", ""),
+        "city_coords": current.get("city_coords"),
+        "radius_limit": current.get("radius_limit")
+    }
     if request.place_to_avoid:
-        resume_state["places_to_avoid"].append(request.place_to_avoid)
+        avoid_set = {x.strip().lower() for x in resume_state["places_to_avoid"]}
+        if request.place_to_avoid.strip().lower() not in avoid_set:
+            resume_state["places_to_avoid"].append(request.place_to_avoid)
 
-    final_state = resume_state.copy()
-    for event in app.stream(resume_state):
-        for node_name, node_output in event.items():
-            if isinstance(node_output, dict):
-                final_state.update(node_output)
+    final_state = await get_app().ainvoke(resume_state)
             
-    return {"itinerary_draft": final_state.get('itinerary_draft'), "current_state": final_state}
\ No newline at end of file
+    return {"itinerary_draft": final_state.get('itinerary_draft'), "current_state": final_state}
+
+def sse_event(data: dict) -> str:
+    return f"data: {json.dumps(data)}\n\n"
+
+# The search phase can run for a minute or more before the first token, so an
+# SSE comment is sent whenever the graph has been quiet this long. It keeps
+# proxies and the client's read timeout from dropping the connection.
+SSE_KEEPALIVE_SECONDS = 15
+
+@api.post("/plan/stream")
+async def stream_plan(request: PlanRequest):
+    """
+    Same as /plan/start, but streams the itinerary as Server-Sent Events.
+    Emits a {"type": "status"} frame as each node finishes, {"type": "token"}
+    frames while the draft is written, then a final {"type": "done"} frame
+    carrying the itinerary and state, or {"type": "error"} if the plan failed.
+    """
+    initial_input = build_initial_state(request)
+
+    async def event_stream():
+        # The graph runs in its own task so the stream can send keep-alives
+        # while a node is still working
+        events = asyncio.Queue()
+
+        async def run_graph():
+            try:
+                async for item in get_app().astream(initial_input, stream_mode=["updates", "messages", "values"]):
+                    await events.put(item)
+            finally:
+                await events.put(None)
+
+        graph_task = asyncio.create_task(run_graph())
+        try:
+            final_state = initial_input.copy()
+            while True:
+                try:
+                    item = await asyncio.wait_for(events.get(), timeout=SSE_KEEPALIVE_SECONDS)
+                except asyncio.TimeoutError:
+                    yield ": keep-alive\n\n"
+                    continue
+                if item is None:
+                    break
+
+                mode, payload = item
+                if mode == "updates":
+                    for node_name in payload:
+                        yield sse_event({"type": "status", "node": node_name})
+                elif mode == "messages":
+                    chunk, metadata = payload
+                    if metadata.get("langgraph_node") == "itinerary_agent" and chunk.content:
+                        yield sse_event({"type": "token", "content": chunk.content})
+                else:
+                    final_state = payload
+
+            # The 200 response has already started, so a graph error can't become
+            # an HTTP status. Report it as an error frame instead of cutting the stream.
+            try:
+                await graph_task
+            except Exception as e:
+                logger.exception("Plan stream failed")
+                yield sse_event({"type": "error", "detail": str(e)})
+                return
+
+            yield sse_event({
+                "type": "done",
+                "itinerary_draft": final_state.get('itinerary_draft'),
+                "current_state": final_state
+            })
+        finally:
+            # Client went away mid-stream: stop the graph instead of finishing it
+            graph_task.cancel()
+
+    return StreamingResponse(event_stream(), media_type="text/event-stream")